@@ -1,9 +1,6 @@
-import json
+import sys
 
-import consts
-from yadisk.yandex_disk import *
+from yadisk.cli import main
 
-disk = YaDisk(consts.OAUTH_TOKEN)
-
-disk.upload_file('/Users/mrshrimp.it/Desktop/InternTaskE', '/')
-disk.upload_file('/Users/mrshrimp.it/Desktop/files 2', '/InternTaskE/')
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
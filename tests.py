@@ -1,10 +1,21 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
 import os.path
+import tempfile
+import threading
 import time
 import unittest
+from unittest import mock
 
 from consts import *
 from yadisk.yandex_disk import *
 from yadisk.exceptions.exceptions import *
+from yadisk.transfer_journal import TransferJournal
+from yadisk.cli import *
+from yadisk.cli import _Context, _build_parser, _parse_size
 
 
 class Tests(unittest.TestCase):
@@ -167,5 +178,469 @@ class Tests(unittest.TestCase):
         self.disk.delete_file('algebra_collooqium_23_24.pdf')
 
 
+class JournalTests(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+
+    def test_restart(self):
+        with TransferJournal(self.path) as journal:
+            journal.plan('/folder/a.txt', size=3, mtime_ns=1)
+            journal.plan('/folder/b.txt', size=5, mtime_ns=1)
+            journal.start('/folder/a.txt')
+            journal.finish('/folder/a.txt', md5='abc')
+            journal.start('/folder/b.txt')
+
+        # the job was interrupted, the new run knows what is left
+        with TransferJournal(self.path) as journal:
+            self.assertTrue(journal.is_done('/folder/a.txt', size=3, mtime_ns=1))
+            self.assertFalse(journal.is_done('/folder/b.txt'))
+            self.assertEqual(journal.pending(), ['/folder/b.txt'])
+            self.assertEqual(journal.get('/folder/a.txt')['md5'], 'abc')
+
+            # the file was modified after uploading, it should be planned again
+            self.assertFalse(journal.is_done('/folder/a.txt', size=4, mtime_ns=2))
+            journal.plan('/folder/a.txt', size=4, mtime_ns=2)
+            self.assertEqual(sorted(journal.pending()), ['/folder/a.txt', '/folder/b.txt'])
+
+    def test_torn_record(self):
+        with TransferJournal(self.path) as journal:
+            journal.plan('/a.txt', size=3)
+            journal.finish('/a.txt')
+        # crash in the middle of writing a record
+        with open(self.path, mode='a') as file:
+            file.write('{"key": "/b.txt", "sta')
+
+        with TransferJournal(self.path) as journal:
+            self.assertTrue(journal.is_done('/a.txt', size=3))
+            self.assertIsNone(journal.get('/b.txt'))
+            journal.plan('/b.txt', size=1)
+        with TransferJournal(self.path) as journal:
+            self.assertEqual(journal.pending(), ['/b.txt'])
+
+    def test_compact(self):
+        with TransferJournal(self.path) as journal:
+            for i in range(10):
+                journal.plan(f'/{i}.txt', size=i)
+                journal.start(f'/{i}.txt')
+                journal.finish(f'/{i}.txt', md5=str(i))
+            journal.compact()
+            journal.finish('/10.txt')
+
+        with open(self.path) as file:
+            self.assertEqual(len(file.readlines()), 11)
+        with TransferJournal(self.path) as journal:
+            self.assertTrue(journal.is_done('/3.txt', size=3, md5='3'))
+            self.assertEqual(journal.pending(), [])
+
+
+class FakeResponse:
+    def __init__(self, status_code, info=None, content=b''):
+        self.status_code = status_code
+        self.text = json.dumps(info or {})
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+
+class JournaledTransferTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.disk = YaDisk(OAUTH_TOKEN)
+        self.journal_path = os.path.join(self.tmp, 'journal.jsonl')
+
+    def _make_tree(self):
+        os.makedirs(os.path.join(self.tmp, 'tree', 'sub'))
+        for name in ('a', 'b', 'sub/c', 'sub/d'):
+            with open(os.path.join(self.tmp, 'tree', name), mode='w') as file:
+                file.write(name)
+        return os.path.join(self.tmp, 'tree')
+
+    def _upload(self, tree, uploaded, fail_after=None):
+        def upload(loc_path, link, chunk_callback=None):
+            if fail_after is not None and len(uploaded) == fail_after:
+                raise ServerError('connection lost')
+            uploaded.append(link)
+
+        with mock.patch.object(self.disk, 'dir_exists', return_value=False), \
+                mock.patch.object(self.disk, 'make_folder'), \
+                mock.patch.object(self.disk, '_get_link_for_uploading', side_effect=lambda path, _: path), \
+                mock.patch.object(self.disk, '_upload_file', side_effect=upload), \
+                TransferJournal(self.journal_path) as journal:
+            self.disk.upload_file(tree, '/', journal=journal)
+
+    def test_upload_resume(self):
+        tree = self._make_tree()
+        first_run = []
+        with self.assertRaises(ServerError):
+            self._upload(tree, first_run, fail_after=2)
+
+        # only the files that were not uploaded are sent again
+        second_run = []
+        self._upload(tree, second_run)
+        self.assertEqual(len(second_run), 2)
+        self.assertEqual(sorted(first_run + second_run), ['/tree/a', '/tree/b', '/tree/sub/c', '/tree/sub/d'])
+
+        # a modified file is sent again, a removed one is forgotten and the journal is compacted
+        with open(os.path.join(tree, 'a'), mode='w') as file:
+            file.write('modified')
+        os.utime(os.path.join(tree, 'a'), ns=(1, 1))
+        os.remove(os.path.join(tree, 'sub/d'))
+        third_run = []
+        self._upload(tree, third_run)
+        self.assertEqual(third_run, ['/tree/a'])
+        with TransferJournal(self.journal_path) as journal:
+            self.assertEqual(journal.pending(), [])
+            self.assertIsNone(journal.get('/tree/sub/d'))
+        with open(self.journal_path) as file:
+            self.assertEqual(len(file.readlines()), 5)
+
+    def _download(self, status_code, content):
+        def request(method, url, headers):
+            if 'resources/download' in url:
+                return FakeResponse(200, {'href': 'https://downloader/file.bin'})
+            return FakeResponse(200, {'name': 'file.bin', 'type': 'file', 'size': 10, 'md5': 'abc'})
+
+        with mock.patch('yadisk.yandex_disk.requests') as fake_requests, \
+                TransferJournal(self.journal_path) as journal:
+            fake_requests.request.side_effect = request
+            fake_requests.get.return_value = FakeResponse(status_code, content=content)
+            self.disk.download_file('/file.bin', self.tmp, tqdm_enabled=False, journal=journal, chunk_size=3)
+            return fake_requests.get
+
+    def _interrupted_download(self):
+        with TransferJournal(self.journal_path) as journal:
+            journal.plan(self.tmp + '/file.bin', src='/file.bin', size=10, md5='abc')
+            journal.start(self.tmp + '/file.bin')
+        with open(os.path.join(self.tmp, 'file.bin'), mode='wb') as file:
+            file.write(b'0123')
+
+    def test_download_resume(self):
+        self._interrupted_download()
+        get = self._download(206, b'456789')
+        self.assertEqual(get.call_args.kwargs['headers'], {'Range': 'bytes=4-'})
+        with open(os.path.join(self.tmp, 'file.bin'), mode='rb') as file:
+            self.assertEqual(file.read(), b'0123456789')
+
+        # the finished file is not downloaded again
+        get = self._download(200, b'0123456789')
+        get.assert_not_called()
+
+    def test_upload_streamed(self):
+        path = os.path.join(self.tmp, 'big.bin')
+        with open(path, mode='wb') as file:
+            file.write(b'0' * 20000)
+        chunks, sent = [], []
+
+        def put(link, data):
+            sent.append(len(data))
+            for chunk in iter(lambda: data.read(8192), b''):
+                sent.append(chunk)
+            return FakeResponse(201)
+
+        with mock.patch('yadisk.yandex_disk.requests.put', side_effect=put):
+            self.disk._upload_file(path, 'link', chunks.append)
+        self.assertEqual(sent[0], 20000)
+        self.assertEqual(b''.join(sent[1:]), b'0' * 20000)
+        self.assertEqual(chunks, [8192, 8192, 3616])
+
+    def test_download_range_not_supported(self):
+        self._interrupted_download()
+        self._download(200, b'0123456789')
+        with open(os.path.join(self.tmp, 'file.bin'), mode='rb') as file:
+            self.assertEqual(file.read(), b'0123456789')
+        with TransferJournal(self.journal_path) as journal:
+            self.assertTrue(journal.is_done(self.tmp + '/file.bin', size=10, md5='abc'))
+
+    def _download_dir(self, listings, downloaded, fail_after=None):
+        def get(url, stream, headers=None):
+            if fail_after is not None and len(downloaded) == fail_after:
+                raise ServerError('connection lost')
+            downloaded.append(url)
+            return FakeResponse(200, content=url.encode())
+
+        with mock.patch('yadisk.yandex_disk.requests') as fake_requests, \
+                mock.patch.object(self.disk, 'get_info', return_value={'name': 'folder', 'type': 'dir'}), \
+                mock.patch.object(self.disk, 'list_dir', side_effect=lambda path: listings[path]), \
+                TransferJournal(self.journal_path) as journal:
+            fake_requests.request.side_effect = lambda method, url, headers: \
+                FakeResponse(200, {'href': url.split('path=')[1]})
+            fake_requests.get.side_effect = get
+            self.disk.download_file('/folder', self.tmp, tqdm_enabled=False, journal=journal)
+
+    def test_download_dir_resume(self):
+        def file(name, size):
+            return {'name': name, 'type': 'file', 'size': size, 'md5': name}
+
+        listings = {
+            '/folder': [file('a', 9), file('b', 9), {'name': 'sub', 'type': 'dir'}],
+            '/folder/sub': [file('c', 13)],
+        }
+        first_run = []
+        with self.assertRaises(ServerError):
+            self._download_dir(listings, first_run, fail_after=2)
+
+        # the folder is downloaded file by file, the finished files are skipped
+        second_run = []
+        self._download_dir(listings, second_run)
+        self.assertEqual(first_run, ['/folder/a', '/folder/b'])
+        self.assertEqual(second_run, ['/folder/sub/c'])
+        with open(os.path.join(self.tmp, 'folder', 'sub', 'c'), mode='rb') as saved_file:
+            self.assertEqual(saved_file.read(), b'/folder/sub/c')
+
+        # a file removed from the folder is forgotten and the journal is compacted
+        listings['/folder'] = listings['/folder'][1:]
+        third_run = []
+        self._download_dir(listings, third_run)
+        self.assertEqual(third_run, [])
+        with TransferJournal(self.journal_path) as journal:
+            self.assertEqual(journal.pending(), [])
+            self.assertIsNone(journal.get(self.tmp + '/folder/a'))
+        with open(self.journal_path) as journal_file:
+            self.assertEqual(len(journal_file.readlines()), 4)
+
+
+class FakeDisk(YaDisk):
+    """
+    In-memory Yandex Disk for the command-line tests.
+    """
+
+    def __init__(self, oauth_token):
+        self.token = oauth_token
+        self.remote = {'/': {'name': '', 'type': 'dir'}}
+        self.uploaded = []
+        self.busy = 0
+        self.listing_busy = False
+        self.broken = set()
+
+    def _check(self):
+        if self.token != OAUTH_TOKEN:
+            raise InvalidTokenError()
+
+    def dir_exists(self, dist_path, dir_in_trash=False):
+        self._check()
+        return self.remote.get(dist_path, {}).get('type') == 'dir'
+
+    def make_folder(self, dist_path):
+        self._check()
+        self.remote[dist_path] = {'name': dist_path.split('/')[-1], 'type': 'dir'}
+
+    def upload_file(self, loc_path, dist_path, overwrite_allowed=True, journal=None, chunk_callback=None):
+        self._check()
+        if self.busy:
+            self.busy -= 1
+            raise ResourceBusyError(error_name='TooManyRequestsError')
+        path = dist_path + loc_path.split('/')[-1]
+        if path in self.broken:
+            raise ServerError('connection lost')
+        with open(loc_path, mode='rb') as file:
+            for chunk in iter(lambda: file.read(8192), b''):
+                if chunk_callback is not None:
+                    chunk_callback(len(chunk))
+        self.remote[path] = {'name': path.split('/')[-1], 'type': 'file', 'size': os.path.getsize(loc_path)}
+        self.uploaded.append(path)
+        if journal is not None:
+            journal.finish(path)
+
+    def list_dir(self, dist_path):
+        self._check()
+        if self.listing_busy:
+            raise ResourceBusyError(error_name='TooManyRequestsError')
+        if dist_path not in self.remote:
+            raise IncorrectDataError(error_name='DiskNotFoundError')
+        if self.remote[dist_path]['type'] == 'file':
+            return [self.remote[dist_path]]
+        return [info for path, info in self.remote.items()
+                if path != '/' and (path.rsplit('/', 1)[0] or '/') == dist_path]
+
+
+class CliTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.disk = FakeDisk(OAUTH_TOKEN)
+        os.makedirs(os.path.join(self.tmp, 'tree', 'sub'))
+        for name in ('a', 'b', 'sub/c'):
+            with open(os.path.join(self.tmp, 'tree', name), mode='w') as file:
+                file.write(name)
+
+    def _main(self, *argv, token=OAUTH_TOKEN):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        self.disk.token = token
+        with mock.patch('yadisk.cli.YaDisk', return_value=self.disk), \
+                mock.patch('yadisk.cli.RETRY_BACKOFF', 0), \
+                contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = main(['--token', token] + list(argv))
+        return code, stdout.getvalue()
+
+    def test_exit_codes(self):
+        tree = os.path.join(self.tmp, 'tree')
+        self.assertEqual(self._main('put', tree, '/')[0], EXIT_OK)
+        self.assertEqual(sorted(self.disk.uploaded), ['/tree/a', '/tree/b', '/tree/sub/c'])
+
+        # the missing path fails, the other one is listed anyway
+        code, output = self._main('--json', 'ls', '/tree', '/nope')
+        self.assertEqual(code, EXIT_FAILED)
+        items = json.loads(output)['items']
+        self.assertEqual(sorted(item['name'] for item in items if item['status'] == 'ok'), ['a', 'b', 'sub'])
+        self.assertEqual([item['path'] for item in items if item['status'] == 'failed'], ['/nope'])
+
+        code, output = self._main('--json', 'ls', '/', token='invalid')
+        self.assertEqual(code, EXIT_AUTH)
+        self.assertIn('error', json.loads(output))
+
+        self.assertEqual(_build_parser().parse_args(['ls', '/']).chunk_size, 1024 ** 2)
+        with contextlib.redirect_stderr(io.StringIO()):
+            for argv in (['ls'], ['--chunk-size', 'inf', 'ls', '/'], ['--limit-rate', '1e400', 'ls', '/']):
+                with self.assertRaises(SystemExit) as error:
+                    self._main(*argv)
+                self.assertEqual(error.exception.code, EXIT_USAGE)
+
+    def test_retry(self):
+        self.disk.busy = 2
+        code, output = self._main('--json', '--stats', '--retries', '2',
+                                  'put', os.path.join(self.tmp, 'tree', 'a'), '/')
+        self.assertEqual(code, EXIT_OK)
+        stats = json.loads(output)['stats']['upload']
+        self.assertEqual((stats['ops'], stats['errors'], stats['bytes']), (1, 2, 1))
+
+        self.disk.busy = 2
+        code, _ = self._main('--retries', '1', 'put', os.path.join(self.tmp, 'tree', 'b'), '/')
+        self.assertEqual(code, EXIT_FAILED)
+
+    def test_sync(self):
+        tree = os.path.join(self.tmp, 'tree')
+        self.assertEqual(self._main('sync', tree, '/')[0], EXIT_OK)
+        self.assertEqual(sorted(self.disk.uploaded), ['/a', '/b', '/sub/c'])
+
+        # only the changed file is sent again
+        self.disk.uploaded.clear()
+        with open(os.path.join(tree, 'sub', 'c'), mode='w') as file:
+            file.write('changed')
+        code, output = self._main('--json', 'sync', tree, '/')
+        self.assertEqual(code, EXIT_OK)
+        self.assertEqual(self.disk.uploaded, ['/sub/c'])
+        statuses = {item['dst']: item['status'] for item in json.loads(output)['items'] if item['op'] == 'put'}
+        self.assertEqual(statuses, {'/a': 'skipped', '/b': 'skipped', '/sub/c': 'ok'})
+
+    def test_sync_listing_failed(self):
+        # a folder that can not be listed is not taken as empty
+        self.disk.listing_busy = True
+        code, _ = self._main('--retries', '0', 'sync', os.path.join(self.tmp, 'tree'), '/')
+        self.assertEqual(code, EXIT_FAILED)
+        self.assertEqual(self.disk.uploaded, [])
+
+    def test_sync_checksum(self):
+        tree = os.path.join(self.tmp, 'tree')
+        self._main('sync', tree, '/')
+        self.disk.remote['/a']['md5'] = hashlib.md5(b'a').hexdigest()
+        self.disk.remote['/b']['md5'] = 'outdated'
+        self.disk.remote['/sub/c']['md5'] = hashlib.md5(b'sub/c').hexdigest()
+        self.disk.uploaded.clear()
+        self.assertEqual(self._main('-j', '3', 'sync', '--checksum', tree, '/')[0], EXIT_OK)
+        self.assertEqual(self.disk.uploaded, ['/b'])
+
+    def test_journal(self):
+        tree = os.path.join(self.tmp, 'tree')
+        journal_path = os.path.join(self.tmp, 'journal.jsonl')
+
+        # the upload of c is interrupted, then c is removed
+        self.disk.broken = {'/tree/sub/c'}
+        self.assertEqual(self._main('--retries', '0', 'put', tree, '/', '--journal', journal_path)[0], EXIT_FAILED)
+        os.remove(os.path.join(tree, 'sub', 'c'))
+        self.disk.uploaded.clear()
+        self.assertEqual(self._main('put', tree, '/', '--journal', journal_path)[0], EXIT_OK)
+        self.assertEqual(self.disk.uploaded, [])
+        with TransferJournal(journal_path) as journal:
+            self.assertEqual(journal.pending(), [])
+            self.assertIsNone(journal.get('/tree/sub/c'))
+
+        # the files that are already on the disk are not left pending by sync
+        os.remove(journal_path)
+        self.assertEqual(self._main('sync', tree, '/tree', '--journal', journal_path)[0], EXIT_OK)
+        self.assertEqual(self.disk.uploaded, [])
+        with TransferJournal(journal_path) as journal:
+            self.assertEqual(journal.pending(), [])
+
+    def test_get_same_names(self):
+        code, output = self._main('--json', 'get', '/a/x.txt', '/b/x.txt', self.tmp)
+        self.assertEqual(code, EXIT_FAILED)
+        self.assertEqual([(item['src'], item['status']) for item in json.loads(output)['items']],
+                         [('/a/x.txt', 'failed'), ('/b/x.txt', 'failed')])
+
+    def test_upload_limit(self):
+        path = os.path.join(self.tmp, 'big.bin')
+        with open(path, mode='wb') as file:
+            file.write(b'0' * 40000)
+        started = time.monotonic()
+        code, output = self._main('--json', '--stats', '--limit-rate', '200K', 'put', path, '/')
+        self.assertEqual(code, EXIT_OK)
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+        self.assertEqual(json.loads(output)['stats']['upload']['bytes'], 40000)
+
+    def test_order(self):
+        def task(delay):
+            def sleep():
+                time.sleep(delay)
+            return sleep
+
+        args = argparse.Namespace(workers=4, chunk_size=1024, retries=0, json=True, limit_rate=None)
+        items = _Context(self.disk, args).run([({'id': i}, task(0.04 - i * 0.01)) for i in range(4)])
+        self.assertEqual([item['id'] for item in items], [0, 1, 2, 3])
+
+    def test_interrupt(self):
+        started = []
+
+        def interrupt():
+            raise KeyboardInterrupt
+
+        def task():
+            started.append(1)
+            time.sleep(0.05)
+
+        args = argparse.Namespace(workers=1, chunk_size=1024, retries=0, json=True, limit_rate=None)
+        with self.assertRaises(KeyboardInterrupt):
+            _Context(self.disk, args).run([({}, interrupt)] + [({}, task) for _ in range(20)])
+        self.assertLess(len(started), 3)
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(10000)
+        started = time.monotonic()
+        threads = [threading.Thread(target=limiter.consume, args=(1000,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - started, 0.39)
+
+        # a single large chunk is limited too
+        started = time.monotonic()
+        RateLimiter(1000000).consume(100000)
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_parse_size(self):
+        self.assertEqual(_parse_size('512'), 512)
+        self.assertEqual(_parse_size('64K'), 64 * 1024)
+        self.assertEqual(_parse_size('1.5m'), 3 * 1024 ** 2 // 2)
+        self.assertEqual(_parse_size('10MB'), 10 * 1024 ** 2)
+
+        for value in ('abc', '0', 'inf', '1e400'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                _parse_size(value)
+
+    def test_stats(self):
+        stats = Stats()
+        stats.record('upload', 0, 1)
+        stats.record('upload', 1, 4)
+        stats.add_bytes('upload', 8)
+        stats.error('upload')
+
+        summary = stats.summary()['upload']
+        self.assertEqual(summary['ops'], 2)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['throughput'], 2)
+        self.assertEqual(summary['latency_avg'], 2)
+        self.assertEqual(summary['latency_max'], 3)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1 +1,4 @@
-AUTH_PAGE = 100
\ No newline at end of file
+AUTH_PAGE = 100
+DOWNLOAD_CHUNK_SIZE = 1024
+LIST_PAGE_LIMIT = 1000
+RETRY_LATER_CODES = (423, 429)  # Locked, Too Many Requests
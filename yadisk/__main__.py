@@ -0,0 +1,5 @@
+import sys
+
+from yadisk.cli import main
+
+sys.exit(main())
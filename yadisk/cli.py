@@ -0,0 +1,602 @@
+"""
+Command-line interface for Yandex Disk built on YaDisk.
+
+    python -m yadisk [options] ls|cp|mv|rm|get|put|sync ...
+
+The OAuth token is taken from --token or from the YADISK_TOKEN environment variable.
+
+Exit codes:
+
+- **0**, if every item was processed
+- **1**, if some items failed (the others were processed)
+- **2**, if the command line is incorrect
+- **3**, if the token is not valid
+- **130**, if the command was interrupted
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from yadisk.exceptions.exceptions import IncorrectDataError
+from yadisk.exceptions.exceptions import InvalidTokenError
+from yadisk.exceptions.exceptions import ResourceBusyError
+from yadisk.exceptions.exceptions import ServerError
+from yadisk.transfer_journal import TransferJournal
+from yadisk.yandex_disk import YaDisk
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_AUTH = 3
+EXIT_INTERRUPTED = 130
+
+TOKEN_ENV = 'YADISK_TOKEN'
+CHUNK_SIZE = 1024 ** 2  # the library default is too small for bulk transfers
+RETRY_BACKOFF = 0.5  # seconds, doubled after every attempt
+RETRY_BACKOFF_MAX = 30
+
+# errors that can disappear if the request is repeated
+RETRIABLE_ERRORS = (ServerError, ResourceBusyError, requests.RequestException)
+# errors that fail a single item, but not the whole command
+ITEM_ERRORS = (IncorrectDataError, ServerError, OSError)
+
+NOT_FOUND_ERROR = 'DiskNotFoundError'
+
+SIZE_SUFFIXES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+class RateLimiter:
+    """
+    Limits the total bandwidth of all workers.
+    """
+
+    def __init__(self, bytes_per_second: int):
+        self._rate = bytes_per_second
+        self._lock = threading.Lock()
+        self._available_at = time.monotonic()
+
+    def consume(self, size: int):
+        """
+        Blocks until size bytes fit into the limit (including the time needed for these bytes).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._available_at = max(self._available_at, now) + size / self._rate
+            delay = self._available_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Stats:
+    """
+    Collects the number of operations, errors, transferred bytes and latencies per phase.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[str, Dict] = {}
+
+    def record(self, phase: str, started: float, finished: float):
+        with self._lock:
+            data = self._phase(phase)
+            data['latencies'].append(finished - started)
+            data['started'] = min(data['started'], started)
+            data['finished'] = max(data['finished'], finished)
+
+    def error(self, phase: str):
+        with self._lock:
+            self._phase(phase)['errors'] += 1
+
+    def add_bytes(self, phase: str, size: int):
+        with self._lock:
+            self._phase(phase)['bytes'] += size
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        :return: for every phase: ops, errors, bytes, throughput (bytes per second of the phase wall time)
+        and latency percentiles in seconds
+        """
+        result = {}
+        with self._lock:
+            for phase, data in self._phases.items():
+                latencies = sorted(data['latencies'])
+                wall = data['finished'] - data['started'] if latencies else 0
+                result[phase] = {
+                    'ops': len(latencies),
+                    'errors': data['errors'],
+                    'bytes': data['bytes'],
+                    'throughput': data['bytes'] / wall if wall > 0 else 0,
+                    'latency_avg': sum(latencies) / len(latencies) if latencies else 0,
+                    'latency_p50': self._percentile(latencies, 0.5),
+                    'latency_p95': self._percentile(latencies, 0.95),
+                    'latency_max': latencies[-1] if latencies else 0,
+                }
+        return result
+
+    def _phase(self, phase: str) -> Dict:
+        if phase not in self._phases:
+            self._phases[phase] = {'latencies': [], 'errors': 0, 'bytes': 0,
+                                   'started': float('inf'), 'finished': float('-inf')}
+        return self._phases[phase]
+
+    @staticmethod
+    def _percentile(values: List[float], fraction: float) -> float:
+        if not values:
+            return 0
+        return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class _Context:
+    def __init__(self, disk: YaDisk, args: argparse.Namespace):
+        self.disk = disk
+        self.workers = args.workers
+        self.chunk_size = args.chunk_size
+        self.retries = args.retries
+        self.json_output = args.json
+        self.stats = Stats()
+        self.limiter = RateLimiter(args.limit_rate) if args.limit_rate else None
+
+    def call(self, phase: str, func: Callable, *args, **kwargs):
+        """
+        Calls func, repeating it with exponential backoff if the server or the network has failed.
+        The latency of the call includes all its attempts.
+        """
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                result = func(*args, **kwargs)
+            except RETRIABLE_ERRORS:
+                self.stats.error(phase)
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(RETRY_BACKOFF * 2 ** attempt, RETRY_BACKOFF_MAX))
+            else:
+                self.stats.record(phase, started, time.monotonic())
+                return result
+
+    def throttle(self, size: int):
+        if self.limiter is not None:
+            self.limiter.consume(size)
+
+    def run(self, tasks: List[Tuple[Dict, Callable[[], Optional[str]]]]) -> List[Dict]:
+        """
+        Runs the tasks in the worker pool. Every task returns its status ('ok' if None),
+        the item of the task is filled with the status and the error message.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(func): item for item, func in tasks}
+            try:
+                for future in as_completed(futures):
+                    item = futures[future]
+                    try:
+                        item['status'] = future.result() or 'ok'
+                    except ITEM_ERRORS as e:
+                        self.fail(item, e)
+            except BaseException:
+                # invalid token, Ctrl-C...: the queued tasks should not be started
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+        # the order of the input, so the output does not depend on the scheduling
+        return [item for item, func in tasks]
+
+    def map(self, func: Callable, values: List) -> List:
+        """
+        Applies func to the values in the worker pool.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                return list(pool.map(func, values))
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def fail(self, item: Dict, error: Exception):
+        item['status'] = 'failed'
+        item['error'] = str(error)
+        if not self.json_output:
+            print(f"yadisk: {item.get('src', item.get('path', ''))}: {error}", file=sys.stderr)
+
+
+# MARK: commands
+
+def _ls(ctx: _Context, args: argparse.Namespace) -> List[Dict]:
+    items = []
+    for path in args.paths:
+        try:
+            listing = ctx.call('list', ctx.disk.list_dir, path)
+        except ITEM_ERRORS as e:
+            item = {'path': path}
+            ctx.fail(item, e)
+            items.append(item)
+            continue
+        for info in listing:
+            item = {name: info.get(name) for name in ('name', 'path', 'type', 'size', 'md5', 'modified')}
+            item['status'] = 'ok'
+            items.append(item)
+            if not ctx.json_output:
+                name = item['name'] + ('/' if item['type'] == 'dir' else '')
+                if args.long:
+                    size = '-' if item['size'] is None else item['size']
+                    print(f"{size:>12}  {item['modified'] or '-':25}  {name}")
+                else:
+                    print(name)
+    return items
+
+
+def _cp(ctx: _Context, args: argparse.Namespace) -> List[Dict]:
+    return ctx.run([({'op': 'cp', 'src': src, 'dst': _remote_dir(args.dst)},
+                     _call_task(ctx, 'copy', ctx.disk.copy_file, src, _remote_dir(args.dst), not args.no_overwrite))
+                    for src in args.srcs])
+
+
+def _mv(ctx: _Context, args: argparse.Namespace) -> List[Dict]:
+    return ctx.run([({'op': 'mv', 'src': src, 'dst': _remote_dir(args.dst)},
+                     _call_task(ctx, 'move', ctx.disk.move_file, src, _remote_dir(args.dst), not args.no_overwrite))
+                    for src in args.srcs])
+
+
+def _rm(ctx: _Context, args: argparse.Namespace) -> List[Dict]:
+    def remove(path):
+        def task():
+            if ctx.call('list', ctx.disk.dir_exists, path):
+                ctx.call('delete', ctx.disk.delete_directory, path, args.permanently)
+            else:
+                ctx.call('delete', ctx.disk.delete_file, path, args.permanently)
+        return task
+
+    return ctx.run([({'op': 'rm', 'src': path}, remove(path)) for path in args.paths])
+
+
+def _get(ctx: _Context, args: argparse.Namespace) -> List[Dict]:
+    def plan(src, journal):
+        def task():
+            info = ctx.call('list', ctx.disk.get_info, src)
+            # a folder plans its own files when its download starts
+            if info.get('type') != 'dir':
+                expected = {name: info[name] for name in ('size', 'md5') if name in info}
+                journal.plan(args.dst + '/' + info.get('name'), src=src, **expected)
+        return task
+
+    def download(src, journal):
+        received = [0]
+
+        def on_chunk(size):
+            received[0] += size
+            ctx.throttle(size)
+
+        def attempt():
+            # only the bytes of the successful attempt are counted
+            received[0] = 0
+            ctx.disk.download_file(src, args.dst, False, journal, ctx.chunk_size, on_chunk)
+
+        def task():
+            ctx.call('download', attempt)
+            ctx.stats.add_bytes('download', received[0])
+        return task
+
+    # sources with the same name would be written into the same local file
+    items = [{'op': 'get', 'src': src, 'dst': args.dst} for src in args.srcs]
+    names = Counter(src.rstrip('/').split('/')[-1] for src in args.srcs)
+    for item in items:
+        name = item['src'].rstrip('/').split('/')[-1]
+        if names[name] > 1:
+            ctx.fail(item, IncorrectDataError(additional_info=f"Several sources are saved as {name}."))
+
+    with _open_journal(args.journal) as journal:
+        queued = [item for item in items if 'status' not in item]
+        if journal is not None:
+            # record the whole job first, so the journal knows when it is completed
+            planned = ctx.run([(dict(item), plan(item['src'], journal)) for item in queued])
+            for item, result in zip(queued, planned):
+                if result['status'] == 'failed':
+                    item.update(result)
+            queued = [item for item in queued if 'status' not in item]
+        ctx.run([(item, download(item['src'], journal)) for item in queued])
+        if journal is not None and not journal.pending():
+            journal.compact()
+    return items
+
+
+def _put(ctx: _Context, args: argparse.Namespace) -> List[Dict]:
+    roots, dirs, files = [], [], []
+    for src in args.srcs:
+        src = src.rstrip('/')
+        if not os.path.exists(src):
+            raise IncorrectDataError(additional_info=f"{src} does not exists.")
+        roots.append((src, _remote_dir(args.dst) + os.path.basename(src)))
+        _walk_local(*roots[-1], dirs, files)
+
+    with _open_journal(args.journal) as journal:
+        if journal is not None:
+            # record the whole job first, so the journal knows when it is completed
+            for local, dst in roots:
+                ctx.disk.plan_upload(local, dst, journal)
+        return _upload_tree(ctx, dirs, files, not args.no_overwrite, journal)
+
+
+def _sync(ctx: _Context, args: argparse.Namespace) -> List[Dict]:
+    if not os.path.isdir(args.src):
+        raise IncorrectDataError(additional_info=f"{args.src} is not a directory.")
+    dirs, files = [], []
+    remote_root = _remote_root(args.dst)
+    _walk_local(args.src.rstrip('/'), remote_root, dirs, files)
+
+    # only missing folders and missing or changed files are sent
+    remote = _walk_remote(ctx, remote_root)
+    missing_dirs = [(local, dst) for local, dst in dirs if remote.get(dst, {}).get('type') != 'dir']
+    changed = [(local, dst) for local, dst in files
+               if remote.get(dst) is None or remote[dst].get('size') != os.path.getsize(local)]
+    if args.checksum:
+        changed_set = set(changed)
+        same_size = [file for file in files if file not in changed_set]
+        digests = ctx.map(lambda file: _file_md5(file[0]), same_size)
+        changed += [file for file, digest in zip(same_size, digests) if remote[file[1]].get('md5') != digest]
+    changed_set = set(changed) | set(missing_dirs)
+    in_sync = [item for item in dirs + files if item not in changed_set]
+
+    with _open_journal(args.journal) as journal:
+        if journal is not None:
+            # the objects that are already in sync are finished right away, so they are not pending forever,
+            # the changed ones are sent again even if the journal remembers them as uploaded
+            ctx.disk.plan_upload(args.src.rstrip('/'), remote_root, journal)
+            journal.finish_many([dst for local, dst in in_sync if not journal.is_done(dst)])
+            for local, dst in changed_set:
+                if journal.is_done(dst):
+                    journal.start(dst)
+        items = _upload_tree(ctx, missing_dirs, [file for file in files if file in changed_set], True, journal)
+    return items + [{'op': 'put', 'src': local, 'dst': dst, 'status': 'skipped'}
+                    for local, dst in files if (local, dst) not in changed_set]
+
+
+# MARK: helpers
+
+def _file_md5(loc_path: str) -> str:
+    md5 = hashlib.md5()
+    with open(loc_path, mode='rb') as file:
+        for block in iter(lambda: file.read(CHUNK_SIZE), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _call_task(ctx: _Context, phase: str, func: Callable, *args) -> Callable[[], None]:
+    def task():
+        ctx.call(phase, func, *args)
+    return task
+
+
+def _remote_dir(path: str) -> str:
+    return path.rstrip('/') + '/'
+
+
+def _remote_root(path: str) -> str:
+    """
+    :return: path without the trailing slash, the root of the disk ('/' or 'disk:/') is kept as is
+    """
+    path = path.rstrip('/')
+    return path if path and not path.endswith(':') else path + '/'
+
+
+def _walk_local(local_path: str, remote_path: str,
+                dirs: List[Tuple[str, str]], files: List[Tuple[str, str]]):
+    """
+    Appends (local path, remote path) of every folder (parents first) and every file of the tree to dirs and files.
+    """
+    if not os.path.isdir(local_path):
+        files.append((local_path, remote_path))
+        return
+    dirs.append((local_path, remote_path))
+    for dir_path, dir_names, file_names in os.walk(local_path):
+        relative = os.path.relpath(dir_path, local_path).replace(os.sep, '/')
+        remote_dir = remote_path if relative == '.' else _remote_dir(remote_path) + relative
+        for name in sorted(dir_names):
+            dirs.append((dir_path + '/' + name, _remote_dir(remote_dir) + name))
+        for name in sorted(file_names):
+            files.append((dir_path + '/' + name, _remote_dir(remote_dir) + name))
+
+
+def _walk_remote(ctx: _Context, remote_path: str) -> Dict[str, Dict]:
+    """
+    :return: descriptions of every object in the remote tree by their paths (built like the local ones)
+    """
+    result = {}
+    level = [remote_path]
+    while level:
+        next_level = []
+        for path, listing in zip(level, ctx.map(lambda p: _list_or_empty(ctx, p), level)):
+            for info in listing:
+                child = _remote_dir(path) + info.get('name')
+                result[child] = info
+                if info.get('type') == 'dir':
+                    next_level.append(child)
+        level = next_level
+    return result
+
+
+def _list_or_empty(ctx: _Context, path: str) -> List[Dict]:
+    try:
+        return ctx.call('list', ctx.disk.list_dir, path)
+    except IncorrectDataError as e:
+        # only a folder that does not exist yet is empty, other errors (busy, forbidden...) fail the command
+        if isinstance(e, ResourceBusyError) or e.err_name != NOT_FOUND_ERROR:
+            raise
+        return []
+
+
+def _upload_tree(ctx: _Context, dirs: List[Tuple[str, str]], files: List[Tuple[str, str]],
+                 overwrite_allowed: bool, journal: Optional[TransferJournal]) -> List[Dict]:
+    def make_folder(dst):
+        def task():
+            if journal is not None and journal.is_done(dst):
+                return 'skipped'
+            if not ctx.call('list', ctx.disk.dir_exists, dst):
+                ctx.call('mkdir', ctx.disk.make_folder, dst)
+            if journal is not None:
+                journal.finish(dst)
+        return task
+
+    def upload(local, dst):
+        sent = [0]
+
+        def on_chunk(size):
+            sent[0] += size
+            ctx.throttle(size)
+
+        def attempt():
+            # only the bytes of the successful attempt are counted
+            sent[0] = 0
+            ctx.disk.upload_file(local, dst[:dst.rfind('/') + 1], overwrite_allowed, journal, on_chunk)
+
+        def task():
+            stat = os.stat(local)
+            if journal is not None and journal.is_done(dst, size=stat.st_size, mtime_ns=stat.st_mtime_ns):
+                return 'skipped'
+            ctx.call('upload', attempt)
+            ctx.stats.add_bytes('upload', sent[0])
+        return task
+
+    # folders are created level by level, so every parent exists before its children
+    items = []
+    levels: Dict[int, List[Tuple[str, str]]] = {}
+    for local, dst in dirs:
+        levels.setdefault(dst.count('/'), []).append((local, dst))
+    for depth in sorted(levels):
+        items += ctx.run([({'op': 'mkdir', 'src': local, 'dst': dst}, make_folder(dst))
+                          for local, dst in levels[depth]])
+    items += ctx.run([({'op': 'put', 'src': local, 'dst': dst}, upload(local, dst)) for local, dst in files])
+
+    if journal is not None and not journal.pending():
+        journal.compact()
+    return items
+
+
+@contextmanager
+def _open_journal(path: Optional[str]):
+    if path is None:
+        yield None
+        return
+    with TransferJournal(path) as journal:
+        yield journal
+
+
+def _parse_size(value: str) -> int:
+    value = value.strip().upper().rstrip('B')
+    suffix = value[-1:] if value[-1:] in SIZE_SUFFIXES else ''
+    try:
+        size = int(float(value[:len(value) - len(suffix)]) * SIZE_SUFFIXES[suffix])
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"size should be positive: {value!r}")
+    return size
+
+
+def _print_stats(stats: Dict[str, Dict]):
+    print(f"{'phase':10} {'ops':>8} {'errors':>7} {'bytes':>14} {'MiB/s':>9} "
+          f"{'avg ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}", file=sys.stderr)
+    for phase, data in stats.items():
+        print(f"{phase:10} {data['ops']:>8} {data['errors']:>7} {data['bytes']:>14} "
+              f"{data['throughput'] / 1024 ** 2:>9.2f} {data['latency_avg'] * 1000:>9.1f} "
+              f"{data['latency_p50'] * 1000:>9.1f} {data['latency_p95'] * 1000:>9.1f} "
+              f"{data['latency_max'] * 1000:>9.1f}", file=sys.stderr)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='yadisk', description='Yandex Disk command-line client.')
+    parser.add_argument('--token', help=f'OAuth token (default: ${TOKEN_ENV})')
+    parser.add_argument('-j', '--workers', type=int, default=4, help='number of parallel transfers (default: 4)')
+    parser.add_argument('--chunk-size', type=_parse_size, default=CHUNK_SIZE,
+                        help='size of download chunks, e.g. 64K (default: 1M)')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='retries of a request after a server or network error (default: 3)')
+    parser.add_argument('--limit-rate', type=_parse_size, default=None,
+                        help='total bandwidth limit in bytes per second, e.g. 10M')
+    parser.add_argument('--json', action='store_true', help='print the result as a JSON document')
+    parser.add_argument('--stats', action='store_true', help='print throughput and latency per phase')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ls = commands.add_parser('ls', help='list folders on Yandex Disk')
+    ls.add_argument('paths', nargs='+')
+    ls.add_argument('-l', '--long', action='store_true', help='print size and modification time')
+    ls.set_defaults(handler=_ls)
+
+    for name, handler, help_text in (('cp', _cp, 'copy objects on Yandex Disk into a folder'),
+                                     ('mv', _mv, 'move objects on Yandex Disk into a folder')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('srcs', nargs='+')
+        command.add_argument('dst')
+        command.add_argument('--no-overwrite', action='store_true')
+        command.set_defaults(handler=handler)
+
+    rm = commands.add_parser('rm', help='delete files or folders on Yandex Disk')
+    rm.add_argument('paths', nargs='+')
+    rm.add_argument('--permanently', action='store_true', help='do not place the objects in the trash')
+    rm.set_defaults(handler=_rm)
+
+    get = commands.add_parser('get', help='download objects into a local folder '
+                                          '(folders as zip, or file by file with --journal)')
+    get.add_argument('srcs', nargs='+')
+    get.add_argument('dst')
+    get.add_argument('--journal', help='journal file to resume an interrupted download')
+    get.set_defaults(handler=_get)
+
+    put = commands.add_parser('put', help='upload local files or folders into a folder on Yandex Disk')
+    put.add_argument('srcs', nargs='+')
+    put.add_argument('dst')
+    put.add_argument('--no-overwrite', action='store_true')
+    put.add_argument('--journal', help='journal file to resume an interrupted upload')
+    put.set_defaults(handler=_put)
+
+    sync = commands.add_parser('sync', help='upload missing or changed files of a local folder')
+    sync.add_argument('src')
+    sync.add_argument('dst')
+    sync.add_argument('--checksum', action='store_true', help='compare md5 of the files, not only sizes')
+    sync.add_argument('--journal', help='journal file to resume an interrupted sync')
+    sync.set_defaults(handler=_sync)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    token = args.token or os.environ.get(TOKEN_ENV)
+    if not token:
+        parser.error(f'the token is required (--token or ${TOKEN_ENV})')
+    if args.workers < 1 or args.retries < 0:
+        parser.error('--workers should be positive and --retries should not be negative')
+
+    ctx, items, error, code = None, [], None, EXIT_OK
+    try:
+        ctx = _Context(YaDisk(token), args)
+        items = args.handler(ctx, args)
+    except InvalidTokenError as e:
+        error, code = str(e), EXIT_AUTH
+    except KeyboardInterrupt:
+        error, code = 'Interrupted.', EXIT_INTERRUPTED
+    except ITEM_ERRORS as e:
+        error, code = str(e), EXIT_FAILED
+    if error is None and any(item['status'] == 'failed' for item in items):
+        code = EXIT_FAILED
+
+    if args.json:
+        # pipelines always get a document, even if the whole command has failed
+        result = {'command': args.command, 'items': items}
+        if error is not None:
+            result['error'] = error
+        if args.stats and ctx is not None:
+            result['stats'] = ctx.stats.summary()
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        if error is not None:
+            print(f'yadisk: {error}', file=sys.stderr)
+        if args.stats and ctx is not None:
+            _print_stats(ctx.stats.summary())
+    return code
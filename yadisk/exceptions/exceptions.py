@@ -10,6 +10,8 @@ class IncorrectDataError(Exception):
             return f"Your data is incorrect.\n{self.additional}"
         elif self.additional is not None and self.err_name is not None:
             return f"[{self.err_name}]. Your data is incorrect.\n{self.additional}"
+        else:
+            return f"[{self.err_name}]. Your data is incorrect."
 
 
 class InvalidTokenError(Exception):
@@ -32,3 +34,14 @@ class ServerError(Exception):
             return "Error has occurred. "
         else:
             return f"Error has occurred.\n{self.additional}"
+
+
+class ResourceBusyError(IncorrectDataError):
+    def __init__(self, additional_info=None, error_name=None):
+        super().__init__(additional_info, error_name)
+
+    def __str__(self):
+        if self.additional is None:
+            return "The resource is locked or there are too many requests, try again later."
+        else:
+            return f"The resource is locked or there are too many requests, try again later.\n{self.additional}"
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+PLANNED = 'planned'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+REMOVED = 'removed'
+
+
+class TransferJournal:
+    """
+    Append-only on-disk journal of a transfer job (upload or download of a tree).
+    Every item of the job is recorded as planned, in flight or done together with its
+    expected size / hash, so a restarted job skips everything the previous run has finished.
+
+    Items are keyed by their destination path. The journal can be shared between threads.
+    A crash can only damage the last line of the file, this line is dropped on opening.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path to the journal file on local disk (created if it does not exist)
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._replay()
+        self._file = open(path, mode='a', encoding='utf-8')
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def plan(self, key: str, **meta):
+        """
+        Records that the item should be transferred.
+        Nothing is written if the item is already known with the same metadata,
+        if the metadata has changed (e.g. the local file was modified) the item is planned again.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and all(entry.get(name) == value for name, value in meta.items()):
+                return
+            self._append(dict(meta, key=key, state=PLANNED))
+
+    def start(self, key: str):
+        """
+        Records that the transfer of the item has begun.
+        """
+        with self._lock:
+            self._append({'key': key, 'state': IN_FLIGHT})
+
+    def finish(self, key: str, **meta):
+        """
+        Records that the item was transferred. This record is flushed to the disk before returning.
+        """
+        with self._lock:
+            self._append(dict(meta, key=key, state=DONE), sync=True)
+
+    def finish_many(self, keys: List[str]):
+        """
+        Records that the items were transferred, the records are flushed to the disk once.
+        """
+        with self._lock:
+            for key in keys:
+                self._append({'key': key, 'state': DONE})
+            os.fsync(self._file.fileno())
+
+    def prune(self, prefix: str, keep: Set[str]):
+        """
+        Forgets the items under prefix (the prefix itself and everything below 'prefix/') that are not in keep,
+        e.g. files that were deleted or renamed on local disk since the previous run.
+        """
+        with self._lock:
+            # the root of the disk ('/' or 'disk:/') already ends with a slash
+            below = prefix.rstrip('/') + '/'
+            removed = [key for key in self._entries
+                       if (key == prefix or key.startswith(below)) and key not in keep]
+            for key in removed:
+                self._append({'key': key, 'state': REMOVED})
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        :return: the last known state and metadata of the item or None if the item is unknown
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry is not None else None
+
+    def is_done(self, key: str, **meta) -> bool:
+        """
+        :return: True if the item was transferred and its recorded metadata matches meta
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.get('state') != DONE:
+                return False
+            return all(entry.get(name) == value for name, value in meta.items())
+
+    def pending(self) -> List[str]:
+        """
+        :return: keys of the items that are planned or in flight
+        """
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.get('state') != DONE]
+
+    def compact(self):
+        """
+        Rewrites the journal so it contains a single record per item.
+        The new file replaces the old one atomically, so a crash during compaction loses nothing.
+        """
+        with self._lock:
+            tmp_path = self._path + '.tmp'
+            with open(tmp_path, mode='w', encoding='utf-8') as tmp:
+                for key, entry in self._entries.items():
+                    tmp.write(json.dumps(dict(entry, key=key), ensure_ascii=False) + '\n')
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            self._file.close()
+            os.replace(tmp_path, self._path)
+            self._file = open(self._path, mode='a', encoding='utf-8')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _replay(self):
+        if not os.path.exists(self._path):
+            return
+        with open(self._path, mode='rb+') as journal:
+            data = journal.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                # the last record was torn by a crash, drop it so new records start on a new line
+                journal.truncate(end)
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'key' in record:
+                self._apply(record)
+
+    def _apply(self, record: Dict):
+        record = dict(record)
+        key = record.pop('key')
+        if record.get('state') == PLANNED:
+            # a new plan replaces everything known about the item
+            self._entries[key] = record
+        elif record.get('state') == REMOVED:
+            self._entries.pop(key, None)
+        else:
+            self._entries.setdefault(key, {}).update(record)
+
+    def _append(self, record: Dict, sync: bool = False):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        self._apply(record)
@@ -1,5 +1,5 @@
 import os.path
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 import requests
 import json
@@ -9,7 +9,9 @@ from yadisk.__constants import *
 from yadisk.__interface import *
 from yadisk.exceptions.exceptions import IncorrectDataError
 from yadisk.exceptions.exceptions import InvalidTokenError
+from yadisk.exceptions.exceptions import ResourceBusyError
 from yadisk.exceptions.exceptions import ServerError
+from yadisk.transfer_journal import TransferJournal
 
 
 class YaDisk(FileExplorerInterface):
@@ -29,13 +31,18 @@ class YaDisk(FileExplorerInterface):
         self._auth(oauth_token)
 
     def upload_file(self, loc_path: str, dist_path: str,
-                    overwrite_allowed: bool = True):
+                    overwrite_allowed: bool = True,
+                    journal: Optional[TransferJournal] = None,
+                    chunk_callback: Optional[Callable[[int], None]] = None):
         """
         Uploads file or folder from local disk on YaDisk.
         You can send a path to folder (not archive). This method will upload folder to YaDisk
         :param loc_path: a path to file or folder on your local disk
         :param dist_path: path where you need to upload your file or folder
         :param overwrite_allowed: True if overwriting is allowed else False
+        :param journal: journal of the transfer (optional). If the upload was interrupted, call this method
+        again with the same journal and only the files that were not uploaded yet will be sent
+        :param chunk_callback: function that is called with the size of every chunk read for sending (optional)
 
         Throws:
 
@@ -48,23 +55,38 @@ class YaDisk(FileExplorerInterface):
             raise IncorrectDataError(additional_info="This file or folder does not exists.")
 
         if not os.path.isdir(loc_path):
-            # 2. Get uploading link
-            link = self._get_link_for_uploading(dist_path + loc_path.split('/')[-1], overwrite_allowed)
-            self._upload_file(loc_path, link)
+            # 2. Get uploading link and upload
+            self._upload_journaled(loc_path, dist_path + loc_path.split('/')[-1], overwrite_allowed, journal,
+                                   chunk_callback)
         else:
-            if not self.dir_exists(dist_path + loc_path.split('/')[-1]):
-                self.make_folder(dist_path + loc_path.split('/')[-1])
-            self._upload_dir(loc_path, dist_path + loc_path.split('/')[-1])
+            upload_path = dist_path + loc_path.split('/')[-1]
+            if journal is not None:
+                # 2. Record the whole tree before uploading
+                self.plan_upload(loc_path, upload_path, journal)
+            self._make_folder_journaled(upload_path, journal)
+            self._upload_dir(loc_path, upload_path, journal, chunk_callback)
+            if journal is not None and not journal.pending():
+                journal.compact()
 
     def download_file(self, dist_path: str, loc_path: str,
-                      tqdm_enabled: bool = True):
+                      tqdm_enabled: bool = True,
+                      journal: Optional[TransferJournal] = None,
+                      chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                      chunk_callback: Optional[Callable[[int], None]] = None):
         """
         :param dist_path: path to a file on Yandex Disk that should be downloaded
         :param loc_path: the path where you want to save the file on local disk
         :param tqdm_enabled: is it necessary to show a loading slider?
+        :param journal: journal of the transfer (optional). If the download was interrupted, call this method
+        again with the same journal and the finished files will be skipped, the interrupted one will be downloaded
+        from the place where it stopped. The journal is compacted when a folder download is completed
+        :param chunk_size: size of the chunks (in bytes) in which the file is read from the network
+        :param chunk_callback: function that is called with the size of every saved chunk (optional)
         :return: None
 
         Download file on local disk. Notice that folders will be downloaded as zip archive.
+        If a journal is given, a folder is downloaded file by file into a local folder instead
+        (the archive is made on the fly by the server, so its download can not be resumed).
 
         Throws:
 
@@ -73,33 +95,29 @@ class YaDisk(FileExplorerInterface):
         - **ServerError** in other cases
         """
         # 0. Check a content type
-        content_name = self._get_name_for_downloading(dist_path)
-
-        # 1. Get download link
-        response = requests.request(method='GET',
-                                    url=f'https://cloud-api.yandex.net/v1/disk/resources/download?path={dist_path}',
-                                    headers=self._get_headers())
-        info = self._process_str_to_dict(response.text)
-
-        if response.status_code == 200:
-            link = info['href']
-        elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
-            raise IncorrectDataError(error_name=info.get('error', None),
-                                     additional_info=info.get('message', None))
-        elif response.status_code == 401:
-            raise InvalidTokenError(additional_info=info.get('message', None))
-        else:
-            raise ServerError(info.get('message', None))
+        resource = self.get_info(dist_path)
+        if journal is None or resource.get('type') != 'dir':
+            self._download_journaled(dist_path, resource, loc_path, tqdm_enabled, journal, chunk_size, chunk_callback)
+            return
 
-        # 2. Download to localhost
-        download_response = requests.get(url=link, stream=True)
-        with open(loc_path + '/' + content_name, mode='wb') as saved_file:
-            if tqdm_enabled:
-                for chunk in tqdm.tqdm(download_response.iter_content(chunk_size=1024)):
-                    saved_file.write(chunk)
-            else:
-                for chunk in download_response.iter_content(chunk_size=1024):
-                    saved_file.write(chunk)
+        # 1. Record the whole tree before downloading, so the journal knows when the job is completed,
+        # and forget the files that were removed from the folder since the previous run
+        local_path = loc_path + '/' + resource.get('name')
+        planned = {local_path}
+        dirs, files = [(dist_path, local_path)], []
+        journal.plan(local_path, src=dist_path)
+        self._plan_remote_dir(dist_path, local_path, journal, planned, dirs, files)
+        journal.prune(local_path, planned)
+
+        # 2. Create local folders and download the files
+        for remote_path, folder_path in dirs:
+            os.makedirs(folder_path, exist_ok=True)
+            if not journal.is_done(folder_path):
+                journal.finish(folder_path)
+        for remote_path, info, folder_path in files:
+            self._download_journaled(remote_path, info, folder_path, tqdm_enabled, journal, chunk_size, chunk_callback)
+        if not journal.pending():
+            journal.compact()
 
     def delete_file(self, dist_path: str,
                     permanently: bool = False):
@@ -149,6 +167,9 @@ class YaDisk(FileExplorerInterface):
 
         if str(response.status_code)[0] == '2':  # 200, 201, 202, 204...
             return info.get('href', None)
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
         elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
             raise IncorrectDataError(error_name=info.get('error', None),
                                      additional_info=info.get('message', None))
@@ -175,6 +196,9 @@ class YaDisk(FileExplorerInterface):
 
         if str(response.status_code)[0] == '2':  # 200, 201, 202, 204...
             return info.get('href', None)
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
         elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
             raise IncorrectDataError(error_name=info.get('error', None),
                                      additional_info=info.get('message', None))
@@ -211,6 +235,7 @@ class YaDisk(FileExplorerInterface):
 
         Throws:
         - **InvalidTokenError**, if your token is not valid
+        - **ResourceBusyError**, if there are too many requests and the call should be repeated later
         """
         addition = '' if not file_in_trash else 'trash/'
         url = f'https://cloud-api.yandex.net/v1/disk/{addition}resources?path={dist_path}'
@@ -222,6 +247,9 @@ class YaDisk(FileExplorerInterface):
             return info.get('type') == 'file'
         elif response.status_code == 401:
             raise InvalidTokenError(additional_info=info.get('message', None))
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
         else:
             return False
 
@@ -235,6 +263,7 @@ class YaDisk(FileExplorerInterface):
         Throws:
 
         - **InvalidTokenError**, if your token is not valid
+        - **ResourceBusyError**, if there are too many requests and the call should be repeated later
         """
 
         addition = '' if not dir_in_trash else 'trash/'
@@ -247,6 +276,9 @@ class YaDisk(FileExplorerInterface):
             return info.get('type') == 'dir'
         elif response.status_code == 401:
             raise InvalidTokenError(additional_info=info.get('message', None))
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
         else:
             return False
 
@@ -273,6 +305,43 @@ class YaDisk(FileExplorerInterface):
 
         if str(response.status_code)[0] == '2':  # 200, 201, 202, ...
             return info.get('href', None)
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
+        elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
+            raise IncorrectDataError(error_name=info.get('error', None),
+                                     additional_info=info.get('message', None))
+        elif response.status_code == 401:
+            raise InvalidTokenError(additional_info=info.get('message', None))
+        else:
+            raise ServerError(info.get('message', None))
+
+    def copy_file(self, src_path: str, dst_path: str,
+                  overwrite_allowed: bool = True) -> str:
+        """
+        Copies a file or folder from one location to another.
+        :param src_path: path where the folder or file is currently located
+        :param dst_path: path where you want to copy the folder or file
+        :param overwrite_allowed: True if overwriting is allowed else False
+        :return: link to the copy on Yandex Disk
+
+        Throws:
+
+        - **InvalidTokenError**, if your token is not valid
+        - **IncorrectDataError**, if your data is incorrect (path is incorrect, the size of file / dir if too high, etc.)
+        - **ServerError** in other cases
+        """
+        dst_path = dst_path + src_path.split('/')[-1]
+        response = requests.request(method='POST',
+                                    url=f'https://cloud-api.yandex.net/v1/disk/resources/copy?from={src_path}&path={dst_path}&overwrite={self._bool_to_str(overwrite_allowed)}',
+                                    headers=self._get_headers())
+        info = self._process_str_to_dict(response.text)
+
+        if str(response.status_code)[0] == '2':  # 200, 201, 202, ...
+            return info.get('href', None)
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
         elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
             raise IncorrectDataError(error_name=info.get('error', None),
                                      additional_info=info.get('message', None))
@@ -281,6 +350,86 @@ class YaDisk(FileExplorerInterface):
         else:
             raise ServerError(info.get('message', None))
 
+    def list_dir(self, dist_path: str) -> List[Dict]:
+        """
+        :param dist_path: path to the dir on Yandex disk
+        :return: descriptions of the objects in the directory (name, path, type, size, md5, modified...).
+        If dist_path is a file, the list contains only its own description
+
+        Throws:
+
+        - **InvalidTokenError**, if your token is not valid
+        - **IncorrectDataError**, if your data is incorrect (a path is incorrect, etc.)
+        - **ServerError** in other cases
+        """
+        items = []
+        while True:
+            response = requests.request(method='GET',
+                                        url=f'https://cloud-api.yandex.net/v1/disk/resources?path={dist_path}&limit={LIST_PAGE_LIMIT}&offset={len(items)}',
+                                        headers=self._get_headers())
+            info = self._process_str_to_dict(response.text)
+
+            if response.status_code == 200:
+                if info.get('type') != 'dir':
+                    return [info]
+                page = info.get('_embedded', {}).get('items', [])
+                items.extend(page)
+                if len(page) < LIST_PAGE_LIMIT:
+                    return items
+            elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+                raise ResourceBusyError(error_name=info.get('error', None),
+                                        additional_info=info.get('message', None))
+            elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
+                raise IncorrectDataError(error_name=info.get('error', None),
+                                         additional_info=info.get('message', None))
+            elif response.status_code == 401:
+                raise InvalidTokenError(additional_info=info.get('message', None))
+            else:
+                raise ServerError(info.get('message', None))
+
+    def get_info(self, dist_path: str) -> Dict:
+        """
+        :param dist_path: path to the object on Yandex disk
+        :return: description of the object (name, path, type, size, md5, modified...)
+
+        Throws:
+
+        - **InvalidTokenError**, if your token is not valid
+        - **IncorrectDataError**, if your data is incorrect (a path is incorrect, the object does not exist, etc.)
+        """
+        url = f'https://cloud-api.yandex.net/v1/disk/resources?path={dist_path}'
+        response = requests.request(method='GET',
+                                    url=url,
+                                    headers=self._get_headers())
+        info = self._process_str_to_dict(response.text)
+        if response.status_code == 200:
+            return info
+        elif response.status_code == 401:
+            raise InvalidTokenError(additional_info=info.get('message', None))
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
+        else:
+            raise IncorrectDataError(additional_info=info.get('message', None))
+
+    def plan_upload(self, loc_path: str, upload_path: str, journal: TransferJournal):
+        """
+        Records a file or a whole folder in the journal before uploading, so the journal knows when the job
+        is completed, and forgets the files that were removed from the folder since the previous run.
+        upload_file does it itself, call this method only if the tree is uploaded in another way
+        :param loc_path: a path to file or folder on your local disk
+        :param upload_path: path of this file or folder on Yandex Disk (including its name)
+        :param journal: journal of the transfer
+        """
+        planned = {upload_path}
+        if os.path.isdir(loc_path):
+            journal.plan(upload_path, src=loc_path)
+            self._plan_dir(loc_path, upload_path, journal, planned)
+        else:
+            stat = os.stat(loc_path)
+            journal.plan(upload_path, src=loc_path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        journal.prune(upload_path, planned)
+
     def get_link(self, dist_path):
         """
         :param dist_path: path to the object on Yandex disk
@@ -329,6 +478,10 @@ class YaDisk(FileExplorerInterface):
                                     headers=self._get_headers())
         if str(response.status_code)[0] == '2':  # 202, 204...
             return
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            info = self._process_str_to_dict(response.text)
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
         elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
             info = self._process_str_to_dict(response.text)
             raise IncorrectDataError(error_name=info.get('error', None),
@@ -340,21 +493,85 @@ class YaDisk(FileExplorerInterface):
             info = self._process_str_to_dict(response.text)
             raise ServerError(info.get('message', None))
 
-    def _get_name_for_downloading(self, dist_path: str) -> str:
-        url = f'https://cloud-api.yandex.net/v1/disk/resources?path={dist_path}'
+    @staticmethod
+    def _get_name_for_downloading(info: Dict) -> str:
+        if info.get('type') == 'dir':
+            return info.get('name') + '.zip'
+        else:
+            return info.get('name')
+
+    def _download_journaled(self, dist_path: str, resource: Dict, loc_path: str, tqdm_enabled: bool,
+                            journal: Optional[TransferJournal], chunk_size: int,
+                            chunk_callback: Optional[Callable[[int], None]]):
+        content_name = self._get_name_for_downloading(resource)
+        saved_path = loc_path + '/' + content_name
+
+        offset = 0
+        if journal is not None:
+            expected = self._expected_meta(resource)
+            saved_size = os.path.getsize(saved_path) if os.path.exists(saved_path) else None
+            if journal.is_done(saved_path, **expected) and saved_size is not None and \
+                    saved_size == expected.get('size', saved_size):
+                return
+            # a partial file is continued only if it belongs to the same version of the remote file
+            previous = journal.get(saved_path)
+            if previous is not None and 'size' in expected and saved_size is not None and \
+                    saved_size < expected['size'] and previous.get('md5') == expected.get('md5'):
+                offset = saved_size
+            journal.plan(saved_path, src=dist_path, **expected)
+            journal.start(saved_path)
+
+        # 1. Get download link
         response = requests.request(method='GET',
-                                    url=url,
+                                    url=f'https://cloud-api.yandex.net/v1/disk/resources/download?path={dist_path}',
                                     headers=self._get_headers())
         info = self._process_str_to_dict(response.text)
+
         if response.status_code == 200:
-            if info.get('type') == 'dir':
-                return info.get('name') + '.zip'
-            else:
-                return info.get('name')
+            link = info['href']
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
+        elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
+            raise IncorrectDataError(error_name=info.get('error', None),
+                                     additional_info=info.get('message', None))
         elif response.status_code == 401:
             raise InvalidTokenError(additional_info=info.get('message', None))
         else:
-            raise IncorrectDataError(additional_info=info.get('message', None))
+            raise ServerError(info.get('message', None))
+
+        # 2. Download to localhost (continue the previous attempt if the server supports ranges)
+        if offset:
+            download_response = requests.get(url=link, stream=True, headers={'Range': f'bytes={offset}-'})
+            if download_response.status_code != 206:
+                offset = 0
+        else:
+            download_response = requests.get(url=link, stream=True)
+        with open(saved_path, mode='ab' if offset else 'wb') as saved_file:
+            chunks = download_response.iter_content(chunk_size=chunk_size)
+            if tqdm_enabled:
+                chunks = tqdm.tqdm(chunks)
+            for chunk in chunks:
+                saved_file.write(chunk)
+                if chunk_callback is not None:
+                    chunk_callback(len(chunk))
+
+        if journal is not None:
+            journal.finish(saved_path)
+
+    def _plan_remote_dir(self, dist_path: str, local_path: str, journal: TransferJournal, planned: set,
+                         dirs: List[Tuple[str, str]], files: List[Tuple[str, Dict, str]]):
+        for info in self.list_dir(dist_path):
+            remote_path = self._join_path(dist_path, info.get('name'))
+            child_path = local_path + '/' + info.get('name')
+            planned.add(child_path)
+            if info.get('type') == 'dir':
+                journal.plan(child_path, src=remote_path)
+                dirs.append((remote_path, child_path))
+                self._plan_remote_dir(remote_path, child_path, journal, planned, dirs, files)
+            else:
+                journal.plan(child_path, src=remote_path, **self._expected_meta(info))
+                files.append((remote_path, info, local_path))
 
     def _get_link_for_uploading(self, dist_path: str,
                                 overwrite_allowed: bool) -> str:
@@ -365,6 +582,9 @@ class YaDisk(FileExplorerInterface):
 
         if response.status_code == 200:
             return info['href']
+        elif response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info.get('error', None),
+                                    additional_info=info.get('message', None))
         elif str(response.status_code)[0] == '4' and response.status_code != 401:  # 400, 403, 406...
             raise IncorrectDataError(error_name=info.get('error', None),
                                      additional_info=info.get('message', None))
@@ -373,13 +593,18 @@ class YaDisk(FileExplorerInterface):
         else:
             raise ServerError(info.get('message', None))
 
-    def _upload_file(self, loc_path: str, link: str):
-        file = open(loc_path, 'rb')
-        upload_response = requests.put(link, files={'file': file})
-        file.close()
+    def _upload_file(self, loc_path: str, link: str,
+                     chunk_callback: Optional[Callable[[int], None]] = None):
+        # the body is streamed from the file, so the callback sees every chunk before it is sent
+        with open(loc_path, 'rb') as file:
+            body = file if chunk_callback is None else _CallbackReader(file, chunk_callback)
+            upload_response = requests.put(link, data=body)
         info_upload = self._process_str_to_dict(upload_response.text)
         if str(upload_response.status_code)[0] == '2':
             return
+        elif upload_response.status_code in RETRY_LATER_CODES:  # 423, 429
+            raise ResourceBusyError(error_name=info_upload.get('error', None),
+                                    additional_info=info_upload.get('message', None))
         elif str(upload_response.status_code)[0] == '4' and upload_response.status_code != 401:  # 400, 403, 406...
             raise IncorrectDataError(error_name=info_upload.get('error', None),
                                      additional_info=info_upload.get('message', None))
@@ -388,14 +613,51 @@ class YaDisk(FileExplorerInterface):
         else:
             raise ServerError(info_upload.get('message', None))
 
-    def _upload_dir(self, local_path: str, upload_path: str):
+    def _upload_dir(self, local_path: str, upload_path: str,
+                    journal: Optional[TransferJournal] = None,
+                    chunk_callback: Optional[Callable[[int], None]] = None):
         for x in sorted(os.listdir(local_path), key=lambda val: os.path.isdir(local_path + '/' + val)):
             if os.path.isdir(local_path + '/' + x):
-                if not self.dir_exists(upload_path + '/' + x):
-                    self.make_folder(upload_path + '/' + x)
-                self._upload_dir(local_path + '/' + x, upload_path + '/' + x)
+                self._make_folder_journaled(self._join_path(upload_path, x), journal)
+                self._upload_dir(local_path + '/' + x, self._join_path(upload_path, x), journal, chunk_callback)
+            else:
+                self._upload_journaled(local_path + '/' + x, self._join_path(upload_path, x), True, journal,
+                                       chunk_callback)
+
+    def _plan_dir(self, local_path: str, upload_path: str, journal: TransferJournal, planned: set):
+        for x in os.listdir(local_path):
+            planned.add(self._join_path(upload_path, x))
+            if os.path.isdir(local_path + '/' + x):
+                journal.plan(self._join_path(upload_path, x), src=local_path + '/' + x)
+                self._plan_dir(local_path + '/' + x, self._join_path(upload_path, x), journal, planned)
             else:
-                self._upload_file(local_path + '/' + x, self._get_link_for_uploading(upload_path + '/' + x, True))
+                stat = os.stat(local_path + '/' + x)
+                journal.plan(self._join_path(upload_path, x), src=local_path + '/' + x,
+                             size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    def _make_folder_journaled(self, dist_path: str, journal: Optional[TransferJournal]):
+        if journal is not None and journal.is_done(dist_path):
+            return
+        if not self.dir_exists(dist_path):
+            self.make_folder(dist_path)
+        if journal is not None:
+            journal.finish(dist_path)
+
+    def _upload_journaled(self, loc_path: str, dist_path: str,
+                          overwrite_allowed: bool, journal: Optional[TransferJournal],
+                          chunk_callback: Optional[Callable[[int], None]] = None):
+        if journal is None:
+            self._upload_file(loc_path, self._get_link_for_uploading(dist_path, overwrite_allowed), chunk_callback)
+            return
+
+        # a file is skipped only if it was not modified since it had been uploaded
+        stat = os.stat(loc_path)
+        if journal.is_done(dist_path, size=stat.st_size, mtime_ns=stat.st_mtime_ns):
+            return
+        journal.plan(dist_path, src=loc_path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        journal.start(dist_path)
+        self._upload_file(loc_path, self._get_link_for_uploading(dist_path, overwrite_allowed), chunk_callback)
+        journal.finish(dist_path)
 
     def _get_headers(self):
         return {
@@ -411,9 +673,38 @@ class YaDisk(FileExplorerInterface):
         except Exception:
             return {}
 
+    @staticmethod
+    def _expected_meta(info: Dict) -> Dict:
+        # size and md5 are known only for files, folders are zipped on the fly
+        return {name: info[name] for name in ('size', 'md5') if name in info}
+
+    @staticmethod
+    def _join_path(dist_path: str, name: str) -> str:
+        return dist_path.rstrip('/') + '/' + name
+
     @staticmethod
     def _bool_to_str(value: bool) -> str:
         if value:
             return "true"
         else:
             return "false"
+
+
+class _CallbackReader:
+    """
+    File wrapper for streaming uploads, reports the size of every chunk that requests reads from the file.
+    """
+
+    def __init__(self, file, callback: Callable[[int], None]):
+        self._file = file
+        self._callback = callback
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._file.read(size)
+        if chunk:
+            self._callback(len(chunk))
+        return chunk
+
+    def __len__(self):
+        # lets requests send Content-Length instead of a chunked body
+        return os.fstat(self._file.fileno()).st_size - self._file.tell()